@@ -5,39 +5,99 @@ Extracts daily chapters from an EPUB file and saves them to chapters.json
 """
 
 import sys
-import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import ebooklib
+import orjson
 from ebooklib import epub
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html as lxml_html
+
+# Tags that carry chapter text. Parsing only these subtrees avoids
+# building the rest of the document.
+TEXT_TAGS = frozenset(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+TEXT_STRAINER = SoupStrainer(TEXT_TAGS)
+
+# Title lookup runs directly on lxml's C tree; EPUB documents are UTF-8
+UTF8_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+FIRST_TITLE_XPATH = etree.XPath('(//h1|//h2|//h3|//title)[1]')
+
+# Month names mapping
+MONTHS = {
+    'january': '01', 'jan': '01',
+    'february': '02', 'feb': '02',
+    'march': '03', 'mar': '03',
+    'april': '04', 'apr': '04',
+    'may': '05',
+    'june': '06', 'jun': '06',
+    'july': '07', 'jul': '07',
+    'august': '08', 'aug': '08',
+    'september': '09', 'sep': '09', 'sept': '09',
+    'october': '10', 'oct': '10',
+    'november': '11', 'nov': '11',
+    'december': '12', 'dec': '12'
+}
+
+# Date patterns for extract_date_from_title, compiled once at import.
+# Month names are factored by shared prefix so each month is a single
+# alternative instead of separate full and abbreviated branches.
+MONTH_NAME = r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)'
+MONTH_DAY_RE = re.compile(MONTH_NAME + r'\s+(\d{1,2})', re.IGNORECASE)
+DAY_MONTH_RE = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?\s+' + MONTH_NAME, re.IGNORECASE)
+DAY_NUMBER_RE = re.compile(r'day\s+(\d{1,3})', re.IGNORECASE)
+
+# A line break plus any blank lines and whitespace around it
+LINE_BREAK_RE = re.compile(r'\s*\n\s*')
 
 
 def clean_html(html_content):
     """Convert HTML to clean text while preserving paragraph breaks."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, 'lxml', from_encoding='utf-8',
+                         parse_only=TEXT_STRAINER)
 
-    # Remove script and style elements
+    # Remove script and style elements nested inside text blocks
     for script in soup(["script", "style"]):
         script.extract()
 
     # Get text with paragraph breaks preserved
+    # find_all(True) walks every tag without per-name matching; a set
+    # lookup then picks out the text blocks
     paragraphs = []
-    for p in soup.find_all(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+    for p in soup.find_all(True):
+        if p.name not in TEXT_TAGS:
+            continue
         text = p.get_text().strip()
         if text:
             paragraphs.append(text)
 
-    # If no paragraphs found, try getting all text
+    # If no paragraphs found, parse the whole document and get all text
     if not paragraphs:
-        text = soup.get_text()
-        # Split on multiple newlines and clean up
-        paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+        soup = BeautifulSoup(html_content, 'lxml', from_encoding='utf-8')
+        for script in soup(["script", "style"]):
+            script.extract()
+        # Treat each non-blank line as a paragraph: collapse every line
+        # break and its surrounding whitespace into a paragraph break
+        return LINE_BREAK_RE.sub('\n\n', soup.get_text().strip())
 
     return '\n\n'.join(paragraphs)
 
 
+def find_title(html_content):
+    """Return the text of the first h1, h2, h3 or title element, or None."""
+    try:
+        root = lxml_html.fromstring(html_content, parser=UTF8_HTML_PARSER)
+    except etree.ParserError:
+        # Empty or unparseable document
+        return None
+
+    title_tags = FIRST_TITLE_XPATH(root)
+    if title_tags:
+        return title_tags[0].text_content().strip()
+    return None
+
+
 def extract_date_from_title(title):
     """
     Attempt to extract a date from chapter title.
@@ -51,41 +111,22 @@ def extract_date_from_title(title):
     """
     title = title.strip()
 
-    # Month names mapping
-    months = {
-        'january': '01', 'jan': '01',
-        'february': '02', 'feb': '02',
-        'march': '03', 'mar': '03',
-        'april': '04', 'apr': '04',
-        'may': '05',
-        'june': '06', 'jun': '06',
-        'july': '07', 'jul': '07',
-        'august': '08', 'aug': '08',
-        'september': '09', 'sep': '09', 'sept': '09',
-        'october': '10', 'oct': '10',
-        'november': '11', 'nov': '11',
-        'december': '12', 'dec': '12'
-    }
-
     # Pattern 1: "January 1" or "Jan 1"
-    pattern1 = r'(january|february|march|april|may|june|july|august|september|october|november|december|jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)\s+(\d{1,2})'
-    match = re.search(pattern1, title, re.IGNORECASE)
+    match = MONTH_DAY_RE.search(title)
     if match:
-        month = months[match.group(1).lower()]
+        month = MONTHS[match.group(1).lower()]
         day = match.group(2).zfill(2)
         return f"{month}-{day}"
 
     # Pattern 2: "1 January" or "1st January", "2nd February", etc.
-    pattern2 = r'(\d{1,2})(?:st|nd|rd|th)?\s+(january|february|march|april|may|june|july|august|september|october|november|december|jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)'
-    match = re.search(pattern2, title, re.IGNORECASE)
+    match = DAY_MONTH_RE.search(title)
     if match:
         day = match.group(1).zfill(2)
-        month = months[match.group(2).lower()]
+        month = MONTHS[match.group(2).lower()]
         return f"{month}-{day}"
 
     # Pattern 3: "Day 1" - assumes sequential from Jan 1
-    pattern3 = r'day\s+(\d{1,3})'
-    match = re.search(pattern3, title, re.IGNORECASE)
+    match = DAY_NUMBER_RE.search(title)
     if match:
         day_number = int(match.group(1))
         if 1 <= day_number <= 366:
@@ -101,6 +142,30 @@ def extract_date_from_title(title):
     return None
 
 
+def parse_item(document):
+    """
+    Parse a single EPUB document given as a (name, content) pair.
+    Runs in a worker process, so it only takes and returns picklable values.
+
+    Returns (title, date_key, text). date_key and text are None when no
+    date is found in the title.
+    """
+    title, content = document
+
+    # Try to get better title from content
+    content_title = find_title(content)
+    if content_title:
+        title = content_title
+
+    # Try to extract date from title
+    date_key = extract_date_from_title(title)
+    if not date_key:
+        return title, None, None
+
+    # Clean and extract text content
+    return title, date_key, clean_html(content)
+
+
 def extract_chapters(epub_path):
     """
     Extract all chapters from EPUB file.
@@ -116,40 +181,27 @@ def extract_chapters(epub_path):
 
     chapters = {}
     skipped = []
-    items = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+    # One pass collects each document's name with its content
+    documents = [(item.get_name(), item.get_content())
+                 for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT)]
+    document_count = len(documents)
 
-    print(f"\nFound {len(items)} document items in EPUB")
+    print(f"\nFound {document_count} document items in EPUB")
     print("Extracting chapters...\n")
 
-    for idx, item in enumerate(items, 1):
-        # Get chapter title from item
-        title = item.get_name()
-
-        # Try to get better title from content
-        content = item.get_content()
-        soup = BeautifulSoup(content, 'html.parser')
-
-        # Try to find a title in the content
-        title_tag = soup.find(['h1', 'h2', 'h3', 'title'])
-        if title_tag:
-            content_title = title_tag.get_text().strip()
-            if content_title:
-                title = content_title
-
-        # Try to extract date from title
-        date_key = extract_date_from_title(title)
-
-        if date_key:
-            # Clean and extract text content
-            text_content = clean_html(content)
-
-            if text_content:
-                chapters[date_key] = text_content
-                print(f"✓ [{idx}/{len(items)}] {date_key}: {title[:50]}...")
+    # Documents parse independently, so spread them across CPU cores
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(parse_item, documents, chunksize=8)
+
+        for idx, (title, date_key, text_content) in enumerate(results, 1):
+            if date_key:
+                if text_content:
+                    chapters[date_key] = text_content
+                    print(f"✓ [{idx}/{document_count}] {date_key}: {title[:50]}...")
+                else:
+                    skipped.append(f"{title} (empty content)")
             else:
-                skipped.append(f"{title} (empty content)")
-        else:
-            skipped.append(f"{title} (no date found)")
+                skipped.append(f"{title} (no date found)")
 
     print(f"\n{'='*60}")
     print(f"Extraction complete!")
@@ -168,15 +220,14 @@ def extract_chapters(epub_path):
 
 def save_chapters(chapters, output_file='chapters.json'):
     """Save chapters dictionary to JSON file."""
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(chapters, f, indent=2, ensure_ascii=False)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(chapters, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
     print(f"\nChapters saved to: {output_file}")
 
     # Show some statistics
     if chapters:
-        dates = sorted(chapters.keys())
-        print(f"Date range: {dates[0]} to {dates[-1]}")
-        avg_length = sum(len(content) for content in chapters.values()) / len(chapters)
+        print(f"Date range: {min(chapters)} to {max(chapters)}")
+        avg_length = sum(map(len, chapters.values())) / len(chapters)
         print(f"Average chapter length: {int(avg_length)} characters")
 
 
@@ -4,106 +4,109 @@ Daily Chapter Email Sender
 Sends today's chapter via Brevo API
 """
 
+import html
+import mmap
 import os
 import sys
-import json
+import re
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
-from dotenv import load_dotenv
-
-# Load environment variables from .env file (for local testing)
-load_dotenv()
-
-
-def load_chapters(chapters_file='chapters_condensed.json'):
-    """Load chapters from JSON file."""
-    if not Path(chapters_file).exists():
-        print(f"Error: {chapters_file} not found!")
-        print("Please run extract_epub.py first to generate the chapters file.")
-        sys.exit(1)
-
-    with open(chapters_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def get_todays_chapter(chapters):
-    """Get the chapter for today's date."""
-    today = datetime.now().strftime('%m-%d')
-    print(f"Looking for chapter for date: {today}")
-
-    if today not in chapters:
-        print(f"Warning: No chapter found for {today}")
-        return None, today
-
-    return chapters[today], today
-
-
-def format_email_html(chapter_content, date_str):
-    """Format chapter content as HTML email."""
-    # Convert date to readable format (add current year to avoid deprecation warning)
-    current_year = datetime.now().year
-    date_obj = datetime.strptime(f"{current_year}-{date_str}", '%Y-%m-%d')
-    readable_date = date_obj.strftime('%B %d')
-
-    # Process paragraphs and detect author attributions
-    paragraphs = chapter_content.split('\n\n')
-    html_paragraphs = []
+from string import Template
+import httpx
+import orjson
+
+# Load environment variables from .env file (for local testing). GitHub
+# Actions runs have no .env, so they skip importing and running dotenv.
+DOTENV_PATH = Path(__file__).with_name('.env')
+if DOTENV_PATH.exists():
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
+
+# Sender display name when SENDER_NAME is unset or empty
+DEFAULT_SENDER_NAME = 'Daily Book Reader'
+
+# Brevo transactional email endpoint
+BREVO_SEND_EMAIL_URL = 'https://api.brevo.com/v3/smtp/email'
+
+# Month names for formatting MM-DD dates without a strptime round-trip
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
+
+# Paragraph breaks, including any whitespace around them
+PARAGRAPH_BREAK_RE = re.compile(r'\s*\n\n\s*')
+# Author attributions start with — or --; captures the author's name
+AUTHOR_RE = re.compile(r'(?=—|--)—*-*\s*(.*)', re.DOTALL)
+
+# Pieces of CSS that minify_styles drops or tightens
+STYLE_BLOCK_RE = re.compile(r'(<style>)(.*?)(</style>)', re.DOTALL)
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_SPACE_RE = re.compile(r'\s*([{};])\s*')
+# Innermost { ... } bodies hold declarations, where spaces around : and , are
+# insignificant; in selectors they are not (".a :first-child")
+CSS_DECLARATIONS_RE = re.compile(r'\{([^{}]*)\}')
+CSS_DECLARATION_SPACE_RE = re.compile(r'\s*([:,])\s*')
+
+
+def minify_styles(markup):
+    """
+    Minify the CSS inside <style> blocks: drop comments, collapse whitespace
+    and remove the last semicolon in each rule. Spaces around : and , are
+    only removed inside declaration blocks, so selectors keep their meaning.
+    The templates below keep readable CSS in the source while the sent
+    email carries the compact form.
+    """
+    def tighten_declarations(match):
+        return '{' + CSS_DECLARATION_SPACE_RE.sub(r'\1', match.group(1)) + '}'
 
-    for para in paragraphs:
-        if not para.strip():
-            continue
+    def minify(match):
+        css = CSS_COMMENT_RE.sub('', match.group(2))
+        css = CSS_SPACE_RE.sub(r'\1', ' '.join(css.split()))
+        css = CSS_DECLARATIONS_RE.sub(tighten_declarations, css)
+        return match.group(1) + css.replace(';}', '}') + match.group(3)
 
-        # Check if this is an author attribution (starts with — or --)
-        if para.strip().startswith('—') or para.strip().startswith('--'):
-            # Author attribution - style differently
-            author = para.strip().lstrip('—').lstrip('-').strip()
-            html_paragraphs.append(f'<p class="author">— {author}</p>')
-        else:
-            # Regular paragraph
-            html_paragraphs.append(f'<p class="quote">{para.strip()}</p>')
+    return STYLE_BLOCK_RE.sub(minify, markup)
 
-    html_paragraphs_str = ''.join(html_paragraphs)
 
-    html_content = f"""<!DOCTYPE html>
+# Daily email skeleton; only the date and paragraphs vary
+EMAIL_TEMPLATE = Template(minify_styles("""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <style>
         /* Email-safe CSS */
-        body {{
+        body {
             margin: 0;
             padding: 0;
             font-family: Georgia, 'Times New Roman', serif;
             background-color: #f5f5f0;
             -webkit-font-smoothing: antialiased;
             -moz-osx-font-smoothing: grayscale;
-        }}
+        }
 
-        .email-wrapper {{
+        .email-wrapper {
             width: 100%;
             background-color: #f5f5f0;
             padding: 20px 0;
-        }}
+        }
 
-        .container {{
+        .container {
             max-width: 600px;
             margin: 0 auto;
             background-color: #ffffff;
             border-radius: 4px;
             overflow: hidden;
             box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-        }}
+        }
 
-        .header {{
+        .header {
             background: linear-gradient(135deg, #8b7355 0%, #6b5344 100%);
             padding: 32px 40px;
             text-align: center;
-        }}
+        }
 
-        .header h1 {{
+        .header h1 {
             margin: 0;
             padding: 0;
             color: #ffffff;
@@ -111,9 +114,9 @@ def format_email_html(chapter_content, date_str):
             font-weight: 400;
             letter-spacing: 0.5px;
             line-height: 1.3;
-        }}
+        }
 
-        .subheader {{
+        .subheader {
             margin: 8px 0 0 0;
             padding: 0;
             color: #f5f5f0;
@@ -122,23 +125,23 @@ def format_email_html(chapter_content, date_str):
             letter-spacing: 1px;
             text-transform: uppercase;
             opacity: 0.9;
-        }}
+        }
 
-        .content {{
+        .content {
             padding: 40px 40px 32px 40px;
             color: #2c2c2c;
             line-height: 1.8;
-        }}
+        }
 
-        .quote {{
+        .quote {
             margin: 0 0 20px 0;
             padding: 0;
             font-size: 16px;
             color: #2c2c2c;
             text-align: left;
-        }}
+        }
 
-        .author {{
+        .author {
             margin: -8px 0 28px 0;
             padding: 0;
             font-size: 14px;
@@ -146,59 +149,59 @@ def format_email_html(chapter_content, date_str):
             font-style: italic;
             text-align: left;
             font-weight: 500;
-        }}
+        }
 
-        .divider {{
+        .divider {
             margin: 32px auto;
             width: 60px;
             height: 1px;
             background-color: #d4c5b9;
-        }}
+        }
 
-        .footer {{
+        .footer {
             padding: 24px 40px 32px 40px;
             background-color: #fafaf8;
             border-top: 1px solid #e8e8e0;
             text-align: center;
-        }}
+        }
 
-        .footer-text {{
+        .footer-text {
             margin: 0;
             padding: 0;
             font-size: 13px;
             color: #8b8b8b;
             font-style: italic;
-        }}
+        }
 
-        .footer-book {{
+        .footer-book {
             margin: 8px 0 0 0;
             padding: 0;
             font-size: 11px;
             color: #a8a8a8;
             letter-spacing: 0.5px;
-        }}
+        }
 
         /* Mobile responsiveness */
-        @media only screen and (max-width: 600px) {{
-            .container {{
+        @media only screen and (max-width: 600px) {
+            .container {
                 border-radius: 0;
-            }}
-            .header {{
+            }
+            .header {
                 padding: 28px 24px;
-            }}
-            .header h1 {{
+            }
+            .header h1 {
                 font-size: 22px;
-            }}
-            .content {{
+            }
+            .content {
                 padding: 32px 24px 24px 24px;
-            }}
-            .quote {{
+            }
+            .quote {
                 font-size: 15px;
-            }}
-            .footer {{
+            }
+            .footer {
                 padding: 20px 24px 28px 24px;
-            }}
-        }}
+            }
+        }
     </style>
 </head>
 <body>
@@ -206,11 +209,11 @@ def format_email_html(chapter_content, date_str):
         <div class="container">
             <div class="header">
                 <h1>Your Daily Reading</h1>
-                <p class="subheader">{readable_date}</p>
+                <p class="subheader">$readable_date</p>
             </div>
 
             <div class="content">
-                {html_paragraphs_str}
+                $html_paragraphs
             </div>
 
             <div class="footer">
@@ -220,156 +223,245 @@ def format_email_html(chapter_content, date_str):
         </div>
     </div>
 </body>
-</html>"""
-
-    return html_content
+</html>"""))
 
-
-def send_email(api_key, sender_email, sender_name, recipient_email, subject, html_content):
-    """Send email via Brevo API."""
-    # Configure API key
-    configuration = sib_api_v3_sdk.Configuration()
-    configuration.api_key['api-key'] = api_key
-
-    # Create API instance
-    api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
-
-    # Prepare email
-    send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-        to=[{"email": recipient_email}],
-        sender={"email": sender_email, "name": sender_name},
-        subject=subject,
-        html_content=html_content
-    )
-
-    try:
-        # Send email
-        api_response = api_instance.send_transac_email(send_smtp_email)
-        print(f"Email sent successfully!")
-        print(f"Message ID: {api_response.message_id}")
-        return True
-
-    except ApiException as e:
-        print(f"Error sending email: {e}")
-        return False
-
-
-def send_error_notification(api_key, sender_email, sender_name, recipient_email, date_str):
-    """Send notification email when chapter is not found."""
-    subject = f"Daily Reading - No Chapter Found for {date_str}"
-
-    current_year = datetime.now().year
-    date_obj = datetime.strptime(f"{current_year}-{date_str}", '%Y-%m-%d')
-    readable_date = date_obj.strftime('%B %d')
-
-    html_content = f"""
+# Sent instead of the daily email when there is no chapter for today
+ERROR_EMAIL_TEMPLATE = Template(minify_styles("""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
         <style>
-            body {{
+            body {
                 font-family: Arial, sans-serif;
                 padding: 20px;
                 max-width: 600px;
                 margin: 0 auto;
-            }}
-            .warning {{
+            }
+            .warning {
                 background-color: #fff3cd;
                 border: 1px solid #ffc107;
                 padding: 20px;
                 border-radius: 5px;
-            }}
-            h2 {{ color: #856404; }}
+            }
+            h2 { color: #856404; }
         </style>
     </head>
     <body>
         <div class="warning">
             <h2>No Chapter Available</h2>
-            <p>Unfortunately, no chapter was found for today's date: <strong>{readable_date}</strong> ({date_str}).</p>
+            <p>Unfortunately, no chapter was found for today's date: <strong>$readable_date</strong> ($date_str).</p>
             <p>This could mean:</p>
             <ul>
                 <li>The book doesn't have a reading for this specific date</li>
                 <li>The extraction process missed this date</li>
                 <li>There's an issue with the chapters.json file</li>
             </ul>
-            <p>Please check your chapters.json file and ensure it contains an entry for "{date_str}".</p>
+            <p>Please check your chapters.json file and ensure it contains an entry for "$date_str".</p>
         </div>
     </body>
     </html>
+    """))
+
+
+def read_today(today, chapters_file='chapters_condensed.json'):
     """
+    Read the chapter for today's MM-DD date from the chapters JSON file.
+    The file is memory-mapped and scanned for today's key, so only that
+    chapter's string is decoded; returns None if there isn't one.
+    """
+    print(f"Looking for chapter for date: {today}")
+
+    # A top-level "MM-DD": "..." entry. Keys quoted inside chapter text are
+    # escaped (\"), so they can't follow the { or , this requires.
+    entry_re = re.compile(
+        rb'[{,]\s*"' + re.escape(today.encode()) + rb'"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"'
+    )
+
+    try:
+        with open(chapters_file, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as chapters:
+            match = entry_re.search(chapters)
+            raw = match.group(1) if match else None
+    except FileNotFoundError:
+        print(f"Error: {chapters_file} not found!")
+        print("Please run extract_epub.py first to generate the chapters file.")
+        sys.exit(1)
+
+    if raw is None:
+        print(f"Warning: No chapter found for {today}")
+        return None
+
+    # Decode escapes by parsing the matched text as a JSON string
+    return orjson.loads(b'"' + raw + b'"')
+
+
+def format_readable_date(date_str):
+    """Convert an MM-DD date string to "Month DD", e.g. "01-05" -> "January 05"."""
+    return f"{MONTH_NAMES[int(date_str[:2]) - 1]} {date_str[3:]}"
+
+
+def format_email_html(chapter_content, readable_date):
+    """Format chapter content as HTML email."""
+    # Process paragraphs and detect author attributions
+    paragraphs = PARAGRAPH_BREAK_RE.split(chapter_content.strip())
+    html_paragraphs = []
+
+    for para in paragraphs:
+        if not para:
+            continue
+
+        # Check if this is an author attribution (starts with — or --)
+        author_match = AUTHOR_RE.match(para)
+        if author_match:
+            # Author attribution - style differently
+            author = html.escape(author_match.group(1), quote=False)
+            html_paragraphs.append(f'<p class="author">— {author}</p>')
+        else:
+            # Regular paragraph
+            html_paragraphs.append(f'<p class="quote">{html.escape(para, quote=False)}</p>')
+
+    return EMAIL_TEMPLATE.substitute(readable_date=readable_date,
+                                     html_paragraphs=''.join(html_paragraphs))
+
+
+@lru_cache(maxsize=1)
+def get_api_client(api_key):
+    """
+    Create the HTTP client for Brevo's API once per API key.
+    Later sends reuse its connection pool instead of opening a new one.
+    """
+    return httpx.Client(
+        headers={
+            'api-key': api_key,
+            'accept': 'application/json',
+            'content-type': 'application/json',
+        },
+        timeout=30.0,
+    )
+
+
+def get_message_id(response):
+    """Return the messageId from a Brevo send response, or None if it has none."""
+    # The email has already been accepted here, so an unexpected body must
+    # not turn a successful send into a crash
+    try:
+        body = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return None
+
+    return body.get('messageId') if isinstance(body, dict) else None
+
+
+def send_email(api_key, sender_email, sender_name, recipient_email, subject, html_content):
+    """Send email via Brevo API."""
+    # Prepare email
+    payload = {
+        "to": [{"email": recipient_email}],
+        "sender": {"email": sender_email, "name": sender_name},
+        "subject": subject,
+        "htmlContent": html_content,
+    }
+
+    try:
+        # Send email
+        response = get_api_client(api_key).post(BREVO_SEND_EMAIL_URL, content=orjson.dumps(payload))
+    except httpx.HTTPError as e:
+        print(f"Error sending email: {e}")
+        return False
+
+    if not response.is_success:
+        print(f"Error sending email: ({response.status_code}) {response.reason_phrase}")
+        print(response.text)
+        return False
+
+    print(f"Email sent successfully!")
+    message_id = get_message_id(response)
+    if message_id:
+        print(f"Message ID: {message_id}")
+    return True
+
+
+@lru_cache(maxsize=32)
+def render_error_html(date_str, readable_date):
+    """Format the notification HTML for a date that has no chapter."""
+    return ERROR_EMAIL_TEMPLATE.substitute(date_str=date_str, readable_date=readable_date)
+
+
+def send_error_notification(api_key, sender_email, sender_name, recipient_email, date_str, readable_date):
+    """Send notification email when chapter is not found."""
+    subject = f"Daily Reading - No Chapter Found for {date_str}"
+
+    html_content = render_error_html(date_str, readable_date)
 
     print("Sending error notification...")
     return send_email(api_key, sender_email, sender_name, recipient_email, subject, html_content)
 
 
+def write_lines(*lines):
+    """Write several status lines to stdout in a single call."""
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+
 def main():
+    """Send today's chapter and return the process exit status."""
     # Get environment variables
-    api_key = os.environ.get('BREVO_API_KEY')
-    sender_email = os.environ.get('SENDER_EMAIL')
-    sender_name = os.environ.get('SENDER_NAME', 'Daily Book Reader')
-    recipient_email = os.environ.get('RECIPIENT_EMAIL')
+    env = os.environ
+    api_key = env.get('BREVO_API_KEY')
+    sender_email = env.get('SENDER_EMAIL')
+    sender_name = env.get('SENDER_NAME') or DEFAULT_SENDER_NAME
+    recipient_email = env.get('RECIPIENT_EMAIL')
 
     # Validate environment variables
-    missing_vars = []
-    if not api_key:
-        missing_vars.append('BREVO_API_KEY')
-    if not sender_email:
-        missing_vars.append('SENDER_EMAIL')
-    if not recipient_email:
-        missing_vars.append('RECIPIENT_EMAIL')
+    required_vars = (
+        ('BREVO_API_KEY', api_key),
+        ('SENDER_EMAIL', sender_email),
+        ('RECIPIENT_EMAIL', recipient_email),
+    )
+    missing_vars = [name for name, value in required_vars if not value]
 
     if missing_vars:
-        print("Error: Missing required environment variables:")
-        for var in missing_vars:
-            print(f"  - {var}")
-        print("\nPlease set these in your GitHub Secrets or environment.")
-        sys.exit(1)
+        write_lines("Error: Missing required environment variables:",
+                    *(f"  - {var}" for var in missing_vars),
+                    "\nPlease set these in your GitHub Secrets or environment.")
+        return 1
 
-    print("="*60)
-    print("Daily Chapter Email Sender")
-    print("="*60)
+    write_lines("="*60, "Daily Chapter Email Sender", "="*60)
 
-    # Load chapters
-    chapters = load_chapters()
-    print(f"Loaded {len(chapters)} chapters from chapters.json")
+    # Work out today's date once and pass it along
+    date_str = datetime.now().strftime('%m-%d')
+    readable_date = format_readable_date(date_str)
 
     # Get today's chapter
-    chapter_content, date_str = get_todays_chapter(chapters)
+    chapter_content = read_today(date_str)
 
     if chapter_content is None:
         # Send error notification
-        success = send_error_notification(api_key, sender_email, sender_name, recipient_email, date_str)
-        sys.exit(0 if success else 1)
+        success = send_error_notification(api_key, sender_email, sender_name, recipient_email,
+                                          date_str, readable_date)
+        return 0 if success else 1
 
     # Format email
-    current_year = datetime.now().year
-    date_obj = datetime.strptime(f"{current_year}-{date_str}", '%Y-%m-%d')
-    readable_date = date_obj.strftime('%B %d')
     subject = f"Your Daily Reading - {readable_date}"
 
-    print(f"Preparing email: {subject}")
-    print(f"Chapter length: {len(chapter_content)} characters")
+    write_lines(f"Preparing email: {subject}",
+                f"Chapter length: {len(chapter_content)} characters")
 
-    html_content = format_email_html(chapter_content, date_str)
+    html_content = format_email_html(chapter_content, readable_date)
 
     # Send email
-    print(f"\nSending to: {recipient_email}")
-    print(f"From: {sender_name} <{sender_email}>")
+    write_lines(f"\nSending to: {recipient_email}",
+                f"From: {sender_name} <{sender_email}>")
 
     success = send_email(api_key, sender_email, sender_name, recipient_email, subject, html_content)
 
     if success:
-        print("\n" + "="*60)
-        print("Daily chapter sent successfully!")
-        print("="*60)
-        sys.exit(0)
+        write_lines("\n" + "="*60, "Daily chapter sent successfully!", "="*60)
+        return 0
     else:
-        print("\n" + "="*60)
-        print("Failed to send daily chapter")
-        print("="*60)
-        sys.exit(1)
+        write_lines("\n" + "="*60, "Failed to send daily chapter", "="*60)
+        return 1
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())